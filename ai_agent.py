@@ -1,35 +1,80 @@
+import asyncio
+import contextlib
+import functools
 import os
+import pathlib
 import google.generativeai as genai
-from github_client import GitHubClient
+from github_client import GitHubClient, clear_caches
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Set GEMINI_ASYNC=0 to fall back to the synchronous SDK call with Gemini's
+# automatic function calling, run in the default executor.
+USE_ASYNC_CHAT = os.getenv("GEMINI_ASYNC", "1") != "0"
 
-def investigate_github_user(username: str) -> str:
+
+def _clean_username(username: str) -> str:
+    """
+    Reduces a username or profile URL to the bare username, e.g.
+    'https://github.com/torvalds/?tab=repositories' -> 'torvalds'.
+    """
+    _, sep, tail = username.rpartition("github.com/")
+    username = tail if sep else username
+    username = username.strip("/ \t\r\n")
+    for delimiter in "/?#":
+        username = username.partition(delimiter)[0]
+    return username
+
+
+# System instruction for the Gemini model, kept next to this module.
+SYSTEM_PROMPT_PATH = pathlib.Path(__file__).with_name("system_prompt.md")
+
+
+@functools.cache
+def _system_instruction() -> str:
+    return SYSTEM_PROMPT_PATH.read_text(encoding="utf-8")
+
+
+@functools.lru_cache(maxsize=1)
+def _client() -> GitHubClient:
+    """Returns the process-wide GitHubClient so tool calls share one connection pool."""
+    return GitHubClient(os.getenv("GITHUB_TOKEN"))
+
+
+def clear_tool_cache() -> None:
+    """Drops all cached GitHub results."""
+    clear_caches()
+
+
+def investigate_github_user(
+    username: str,
+    include_full_list: bool = False,
+    refresh: bool = False,
+) -> str:
     """
     Investigates a GitHub user's profile, repositories, and activity.
     
     Args:
         username: The GitHub username to investigate. Can be extracted from URLs like 'github.com/username'.
+        include_full_list: Also list every analyzed repository, not just the most starred ones.
+        refresh: Set to true to bypass cached results, e.g. when the user asks for fresh data.
     
     Returns:
         A detailed summary of the user's GitHub profile including repositories, languages, and activity.
     """
-    logger.info(f"Investigating user: {username}")
-    # Clean username if it's a URL
-    if "github.com/" in username:
-        username = username.split("github.com/")[-1].strip("/")
-    
-    github_token = os.getenv('GITHUB_TOKEN')
-    github_client = GitHubClient(github_token)
-    return github_client.get_user_summary(username)
+    logger.info("Investigating user: %s", username)
+    username = _clean_username(username)
+
+    github_client = _client()
+    return github_client.get_user_summary(username, include_full_list=include_full_list, refresh=refresh)
 
 
 def inspect_github_repository(
     repository: str,
     max_files: int = 10,
     path_filter: str | None = None,
+    refresh: bool = False,
 ) -> str:
     """
     Performs a code-level inspection of a GitHub repository.
@@ -40,23 +85,25 @@ def inspect_github_repository(
         max_files: Maximum number of code files to sample.
         path_filter: Optional substring to focus on paths containing it,
                      e.g. 'src', 'backend', 'api'.
+        refresh: Set to true to bypass cached results, e.g. when the user asks for fresh data.
 
     Returns:
         A textual summary including repository metadata and code snippets from
         selected files, suitable for AI analysis.
     """
-    github_token = os.getenv("GITHUB_TOKEN")
-    github_client = GitHubClient(github_token)
+    github_client = _client()
     return github_client.inspect_repository(
         repo=repository,
         max_files=max_files,
         path_filter=path_filter,
+        refresh=refresh,
     )
 
 
 def list_github_repositories(
     username: str,
     max_repos: int = 300,
+    refresh: bool = False,
 ) -> str:
     """
     Returns a list of repositories for a GitHub user.
@@ -64,15 +111,16 @@ def list_github_repositories(
     Args:
         username: GitHub username or profile URL.
         max_repos: Maximum number of repositories to list.
+        refresh: Set to true to bypass cached results, e.g. when the user asks for fresh data.
     """
-    github_token = os.getenv("GITHUB_TOKEN")
-    github_client = GitHubClient(github_token)
-    return github_client.list_user_repositories(username=username, max_repos=max_repos)
+    github_client = _client()
+    return github_client.list_user_repositories(username=_clean_username(username), max_repos=max_repos, refresh=refresh)
 
 
 def get_github_repository_structure(
     repository: str,
     max_entries: int = 500,
+    refresh: bool = False,
 ) -> str:
     """
     Returns the folder/file structure for a GitHub repository.
@@ -81,10 +129,10 @@ def get_github_repository_structure(
         repository: GitHub repository identifier or URL, e.g. 'owner/name'
                    or 'https://github.com/owner/name'.
         max_entries: Maximum number of tree entries (directories + files).
+        refresh: Set to true to bypass cached results, e.g. when the user asks for fresh data.
     """
-    github_token = os.getenv("GITHUB_TOKEN")
-    github_client = GitHubClient(github_token)
-    return github_client.get_repository_tree(repo=repository, max_entries=max_entries)
+    github_client = _client()
+    return github_client.get_repository_tree(repo=repository, max_entries=max_entries, refresh=refresh)
 
 
 def inspect_github_repository_files(
@@ -92,6 +140,7 @@ def inspect_github_repository_files(
     max_files: int = 200,
     max_chars_per_file: int = 300,
     path_filter: str | None = None,
+    refresh: bool = False,
 ) -> str:
     """
     Returns code snippets for files in a GitHub repository.
@@ -101,144 +150,164 @@ def inspect_github_repository_files(
                    or 'https://github.com/owner/name'.
         max_files: Maximum number of files to include.
         max_chars_per_file: Maximum number of characters per file snippet.
+        refresh: Set to true to bypass cached results, e.g. when the user asks for fresh data.
     """
-    github_token = os.getenv("GITHUB_TOKEN")
-    github_client = GitHubClient(github_token)
+    github_client = _client()
     return github_client.inspect_repository_files(
         repo=repository,
         max_files=max_files,
         max_chars_per_file=max_chars_per_file,
         path_filter=path_filter,
+        refresh=refresh,
+    )
+
+TOOLS = [
+    investigate_github_user,
+    list_github_repositories,
+    inspect_github_repository,
+    get_github_repository_structure,
+    inspect_github_repository_files,
+]
+_TOOLS_BY_NAME = {tool.__name__: tool for tool in TOOLS}
+
+
+MODEL_NAME = "gemini-2.0-flash"
+
+
+@functools.cache
+def _configure() -> None:
+    """Configures the Gemini SDK once per process."""
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise ValueError("GOOGLE_API_KEY not found in environment variables")
+
+    genai.configure(api_key=api_key)
+
+
+@functools.cache
+def _build_model(model_name: str) -> genai.GenerativeModel:
+    """Builds the tool-enabled model once per model name and shares it between agents."""
+    _configure()
+    return genai.GenerativeModel(
+        model_name=model_name,
+        tools=TOOLS,
+        system_instruction=_system_instruction(),
     )
 
+
 class AIAgent:
     def __init__(self, github_token=None):
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
-            raise ValueError("GOOGLE_API_KEY not found in environment variables")
-        
-        genai.configure(api_key=api_key)
-        
-        self.model = genai.GenerativeModel(
-            model_name="gemini-2.0-flash",
-            tools=[
-                investigate_github_user,
-                list_github_repositories,
-                inspect_github_repository,
-                get_github_repository_structure,
-                inspect_github_repository_files,
-            ],
-            system_instruction="""
-You are an AI recruiter and technical interviewer whose ONLY reliable information about GitHub users and repositories
-comes from the registered tools in this model.
-
-You DO NOT have direct access to the internet or to GitHub outside of these tools. You must treat the tool outputs as
-the single source of truth. If something is not present in the tool responses (or explicitly written in the user's message),
-you must behave as if you do not know it.
-
-LANGUAGE AND STYLE
-------------------
-- Always answer in Ukrainian (українською мовою), regardless of the language of the user's question.
-- Use a concise, professional, friendly tone.
-- Format answers with simple Markdown that works well in Telegram (headings, bullet lists, inline code). Avoid complex nesting.
-
-COMMUNICATION ABOUT TOOLS (IMPORTANT)
-------------------------------------
-- Never mention internal tool names like `investigate_github_user`, `list_github_repositories`,
-  `inspect_github_repository`, `get_github_repository_structure` or `inspect_github_repository_files` in your replies.
-- Never say that you are “calling”, “using” or “going to use” a tool or function.
-- The user should only see your final conclusions and explanations based on the data, not how you obtained it.
-- If you need more data, silently call tools and then answer; do not describe this internal process.
-
-TOOL USAGE – STRICT RULES
--------------------------
-- Whenever a message contains a GitHub username or a profile URL (like "https://github.com/username"), you MUST:
-  1) Extract the username.
-  2) Call the tool `investigate_github_user` for that username BEFORE giving any assessment of that user.
-
-- To understand repositories and code in more detail you MAY additionally call:
-  - `list_github_repositories` to see all repos for the user.
-  - `get_github_repository_structure` for a repo's folder/file tree.
-  - `inspect_github_repository_files` to read short snippets from many files in a repo.
-  - `inspect_github_repository` for a lighter, sampled overview of files in a repo.
-
-- If you need more data about code or structure, CALL THE TOOLS. Do not “imagine” files, folders or repositories.
-- You can and should call tools multiple times in one conversation (overview → list repos → inspect several repos).
-
-ANTI‑HALLUCINATION RULES (VERY IMPORTANT)
-----------------------------------------
-- Never invent repository names, project names, or folders. You may only mention a repository if:
-  - its name appears in the output of one of the tools, OR
-  - its name appears explicitly in the user's message.
-
-- Never invent technologies, languages, or frameworks. You may only say that the user works with a language/stack if:
-  - it appears in tool output (for example in a "Language:" field or in code snippets), OR
-  - it is explicitly mentioned by the user.
-
-- Do NOT assume the existence of Telegram bots, React Native apps, games, templates, etc., if the tools did not show such repos.
-  If the tools do not list a repo called "telegram-rss-bot" (for example), you must not talk about it.
-
-- If a tool returns an error (e.g., 404 Not Found for a specific repo), you may briefly mention that some repositories
-  are not accessible, but:
-  - do NOT speculate about their contents,
-  - do NOT invent extra repo names,
-  - and do NOT base your overall assessment on those missing repos.
-
-NO SPECULATION / NO GUESSES
----------------------------
-- Do not “guess” or “assume” anything about the contents of repositories or laboratory works.
-- Avoid phrases like "я можу лише здогадуватися", "можна припустити", "скоріш за все" щодо коду або змісту репозиторіїв.
-- If the user asks що саме в лабораторних / про що конкретний репозиторій (наприклад: "які саме лабораторні роботи, про що"),
-  you MUST first inspect the relevant repositories using the available inspection tools and only then answer.
-- If even after calling the tools there is still not enough information (порожній репозиторій, відсутні файли тощо),
-  clearly say that there are not enough open data to answer, instead of guessing.
-
-PROFILE ANALYSIS
-----------------
-- When you answer general questions like "що ти можеш сказати про цього користувача?", do the following:
-  1) Use `investigate_github_user` (and, if helpful, `list_github_repositories`) to get a list of repos, languages and basic stats.
-  2) Summarize:
-     - Main languages that actually appear in the tool output.
-     - Types of projects that are clearly visible from repo names/descriptions and inspected code; do not assign a domain
-       to a project if it is not clearly indicated in the data.
-     - Any noticeable strengths (e.g., consistent activity, variety of domains, presence of tests, clear structure).
-     - Any limitations you can see (e.g., many small educational repos, few larger production‑like projects, little testing).
-  3) Make it clear how many repos you actually considered (for example:
-     "Я проаналізував(ла) N публічні репозиторії цього користувача на GitHub").
-
-ROLE / LEVEL ASSESSMENT
------------------------
-- Only discuss fit for a specific role when the user explicitly asks (for example: "На яку роль ти б рекомендував цього кандидата?",
-  "Чи підходить він на роль Senior Flutter Engineer?").
-
- - When you assess role/level:
-  - Base your judgment ONLY on evidence from tool outputs (repo list, descriptions, code snippets).
-  - If there is enough relevant evidence, give a cautious but concrete opinion (e.g., closer to junior frontend, strong junior backend,
-    near middle fullstack, etc.) and clearly explain WHY using specific repos/technologies from the tools.
-  - If there is very little or no relevant evidence for that stack/role, say so explicitly instead of inventing projects or skills.
-    For example: explain that you see almost no Flutter code in public repos, so you cannot strongly support a "Senior Flutter" conclusion.
-
-- It is better to say:
-  - "У відкритих репозиторіях я бачу лише X і Y, тому не бачу достатніх доказів рівня senior у Z",
-  than to invent projects or technologies that are not present in the data.
-
-BEHAVIOUR SUMMARY
------------------
-- Always:
-  - Use the tools first.
-  - Ground every factual claim about repos, technologies, or code in tool output or the user’s own words.
-  - Make your reasoning transparent: mention which repos or code samples you relied on.
-
-- Never:
-  - Hallucinate or guess repository names, project types, or tech stacks.
-  - Claim you "see" a project, language, or framework that the tools did not show.
-  - Pretend to have browsed GitHub directly or to know information beyond the tools.
-  - Expose or describe your internal tool calls or the names of tools/functions you used.
-
-Despite being careful, still aim to give a useful, practical answer based on the actual evidence you have, expressed clearly
-and concisely in Ukrainian with simple Markdown formatting.
-"""
-        )
+        self.model = _build_model(MODEL_NAME)
 
     def start_chat(self):
-        return self.model.start_chat(enable_automatic_function_calling=True)
+        # The async path resolves function calls itself (see send_message).
+        return self.model.start_chat(enable_automatic_function_calling=not USE_ASYNC_CHAT)
+
+    async def send_message(self, chat_session, text: str):
+        """
+        Sends a user message to the chat session and returns the final response.
+
+        Gemini's automatic function calling invokes tools synchronously, even
+        from send_message_async, which would block the event loop on GitHub I/O.
+        So the async path awaits the model directly and runs each requested
+        tool in a worker thread, feeding the results back until the model
+        answers with text.
+        """
+        if not USE_ASYNC_CHAT:
+            return await asyncio.to_thread(chat_session.send_message, text)
+
+        with _atomic_turn(chat_session):
+            response = await chat_session.send_message_async(text)
+            while function_calls := _get_function_calls(response):
+                tool_results = await _run_tools(function_calls)
+                response = await chat_session.send_message_async(tool_results)
+        return response
+
+    async def stream_message(self, chat_session, text: str):
+        """
+        Like send_message, but yields the model's answer in text chunks as
+        they are generated. Tool calls requested mid-stream are resolved
+        before the model continues.
+        """
+        if not USE_ASYNC_CHAT:
+            response = await self.send_message(chat_session, text)
+            yield response.text
+            return
+
+        content = text
+        with _atomic_turn(chat_session):
+            while True:
+                response = await chat_session.send_message_async(content, stream=True)
+                async for chunk in response:
+                    if piece := _chunk_text(chunk):
+                        yield piece
+
+                function_calls = _get_function_calls(response)
+                if not function_calls:
+                    return
+                content = await _run_tools(function_calls)
+
+
+@contextlib.contextmanager
+def _atomic_turn(chat_session):
+    """
+    Restores the chat history if a turn fails or is cancelled midway.
+
+    Each model reply is committed to the history as soon as it arrives, so
+    an aborted turn would otherwise leave an unanswered function call or an
+    interrupted stream behind, and every later message in the chat would
+    be rejected.
+    """
+    history = list(chat_session.history)
+    try:
+        yield
+    except BaseException:
+        chat_session.history = history
+        raise
+
+
+def _get_function_calls(response) -> list:
+    parts = response.candidates[0].content.parts
+    return [part.function_call for part in parts if "function_call" in part]
+
+
+def _chunk_text(chunk) -> str:
+    if not chunk.candidates:
+        return ""
+    return "".join(part.text for part in chunk.candidates[0].content.parts if "text" in part)
+
+
+async def _run_tools(function_calls) -> genai.protos.Content:
+    """
+    Runs the requested tools concurrently in worker threads and packs their
+    results for the model.
+
+    Calls returned together in one model turn were issued without seeing
+    each other's results, so they are independent and safe to overlap.
+    """
+    results = await asyncio.gather(
+        *(asyncio.to_thread(_call_tool, fc) for fc in function_calls)
+    )
+    parts = [
+        genai.protos.Part(
+            function_response=genai.protos.FunctionResponse(
+                name=fc.name,
+                response={"result": result},
+            )
+        )
+        for fc, result in zip(function_calls, results)
+    ]
+    return genai.protos.Content(parts=parts)
+
+
+def _call_tool(fc) -> str:
+    tool = _TOOLS_BY_NAME.get(fc.name)
+    if tool is None:
+        return f"Unknown tool: {fc.name}"
+    # Errors go back to the model as the tool result, so it can correct its
+    # arguments or tell the user, and the turn still completes.
+    try:
+        return tool(**fc.args)
+    except Exception as e:
+        logger.exception("Tool %s failed", fc.name)
+        return f"Error calling {fc.name}: {e}"
@@ -1,12 +1,14 @@
+import asyncio
 import logging
 import os
-import asyncio
 import re
+from collections import OrderedDict, deque
 from dotenv import load_dotenv
 from telegram import Update
-from telegram.error import BadRequest
+from telegram.error import BadRequest, TelegramError
+from telegram.request import HTTPXRequest
 from telegram.ext import ApplicationBuilder, ContextTypes, CommandHandler, MessageHandler, filters
-from ai_agent import AIAgent
+from ai_agent import AIAgent, clear_tool_cache
 
 # Load environment variables
 load_dotenv()
@@ -18,6 +20,36 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Third-party libraries are chatty at INFO (httpx logs every Telegram poll).
+for noisy_logger in ("httpx", "telegram", "urllib3", "google"):
+    logging.getLogger(noisy_logger).setLevel(logging.WARNING)
+
+# Minimum delay between edits of a streamed reply; Telegram allows roughly
+# one message edit per second per chat.
+STREAM_EDIT_INTERVAL = 1.0
+
+# Upper bound on live Gemini chat sessions; the least recently used ones
+# are dropped (together with their history) beyond this size.
+MAX_CHAT_SESSIONS = int(os.getenv("MAX_CHAT_SESSIONS", "1024"))
+
+# Incoming messages wait in per-chat queues served by a fixed pool of
+# workers; messages beyond BOT_QUEUE pending in total, or BOT_CHAT_QUEUE
+# pending in one chat, are rejected immediately.
+BOT_QUEUE_SIZE = int(os.getenv("BOT_QUEUE", "64"))
+BOT_CHAT_QUEUE_SIZE = int(os.getenv("BOT_CHAT_QUEUE", "4"))
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "8"))
+
+# Telegram user ids allowed to run admin commands such as /flushcache.
+ADMIN_USER_IDS = {
+    int(user_id) for user_id in os.getenv("ADMIN_USER_IDS", "").split(",") if user_id.strip()
+}
+
+# Detects messages that mention a GitHub link, without lowercasing a copy of the text.
+_GITHUB_RE = re.compile(r"github\.com", re.IGNORECASE)
+
+# Formatting characters removed by _strip_markdown.
+_MD_STRIP_TABLE = str.maketrans("", "", "*_`")
+
 
 def _strip_markdown(text: str) -> str:
     """
@@ -30,16 +62,118 @@ def _strip_markdown(text: str) -> str:
     if not isinstance(text, str):
         return text
     # Remove *, _, ` which are often used for bold/italic/code.
-    return re.sub(r"[*_`]", "", text)
+    return text.translate(_MD_STRIP_TABLE)
+
+# Characters that must be backslash-escaped in Telegram MarkdownV2 text.
+_MDV2_ESCAPE = str.maketrans({c: "\\" + c for c in "_*[]()~`>#+-=|{}.!\\"})
+# Inside code/pre entities only '`' and '\' must be escaped.
+_MDV2_CODE_ESCAPE = str.maketrans({"`": "\\`", "\\": "\\\\"})
+
+# Markdown constructs from model output that are kept as formatting.
+_MD_TOKEN_RE = re.compile(
+    r"```[^\n`]*\n?(?P<pre>.*?)```"
+    r"|`(?P<code>[^`\n]+)`"
+    r"|^(?P<heading>#{1,6}[ \t]+[^\n]+)$"
+    r"|^(?P<bullet>[ \t]*[*-][ \t]+)"
+    # Link URLs may contain one level of balanced parentheses (e.g. Wikipedia).
+    r"|\[(?P<link_text>[^\]\n]+)\]\((?P<link_url>(?:[^()\s]|\([^()\s]*\))+)\)"
+    r"|\*\*(?P<bold2>[^*\n]+?)\*\*"
+    r"|\*(?P<bold>[^*\s](?:[^*\n]*[^*\s])?)\*",
+    re.DOTALL | re.MULTILINE,
+)
+
+
+def _escape_mdv2(text: str) -> str:
+    return text.translate(_MDV2_ESCAPE)
+
+
+def _to_markdown_v2(text: str) -> str:
+    """
+    Converts the model's loose Markdown into Telegram MarkdownV2.
+
+    Code blocks, inline code, links, bold text (`**x**` or `*x*`) and
+    headings (rendered bold) are kept; list markers become bullets and
+    everything else is escaped, so Telegram always accepts the result.
+    """
+    out = []
+    pos = 0
+    for match in _MD_TOKEN_RE.finditer(text):
+        out.append(_escape_mdv2(text[pos:match.start()]))
+        pos = match.end()
+        kind = match.lastgroup
+        if kind == "pre":
+            out.append("```\n" + match["pre"].translate(_MDV2_CODE_ESCAPE) + "```")
+        elif kind == "code":
+            out.append("`" + match["code"].translate(_MDV2_CODE_ESCAPE) + "`")
+        elif kind == "heading":
+            heading = _strip_markdown(match["heading"].lstrip("#")).strip()
+            out.append("*" + _escape_mdv2(heading) + "*")
+        elif kind == "bullet":
+            indent = match["bullet"][: len(match["bullet"]) - len(match["bullet"].lstrip())]
+            out.append(indent + "• ")
+        elif kind == "link_url":
+            url = match["link_url"].replace("\\", "\\\\").replace(")", "\\)")
+            out.append("[" + _escape_mdv2(match["link_text"]) + "](" + url + ")")
+        else:
+            out.append("*" + _escape_mdv2(match[kind]) + "*")
+    out.append(_escape_mdv2(text[pos:]))
+    return "".join(out)
+
+async def _edit_message(bot, chat_id: int, message_id: int, text: str, parse_mode: str | None = None):
+    """
+    Edits a bot message, ignoring Telegram's error for unchanged content.
+    """
+    try:
+        await bot.edit_message_text(
+            chat_id=chat_id,
+            message_id=message_id,
+            text=text,
+            parse_mode=parse_mode,
+        )
+    except BadRequest as e:
+        if "Message is not modified" not in str(e):
+            raise
 
 # Initialize AI Agent
 try:
     github_token = os.getenv('GITHUB_TOKEN')
     agent = AIAgent(github_token)
 except Exception as e:
-    logger.error(f"Failed to initialize AI Agent: {e}")
+    logger.error("Failed to initialize AI Agent: %s", e)
     agent = None
 
+# Gemini chat sessions by Telegram chat id, least recently used first.
+_chat_sessions: OrderedDict = OrderedDict()
+
+def get_or_create_chat(chat_id: int):
+    """
+    Returns the Gemini chat session for the given chat, creating it if needed.
+
+    Sessions are kept in LRU order so memory stays bounded on a public bot.
+    No locking is needed: this never awaits, so it runs atomically on the
+    event loop.
+    """
+    chat_session = _chat_sessions.get(chat_id)
+    if chat_session is not None:
+        _chat_sessions.move_to_end(chat_id)
+        return chat_session
+
+    chat_session = _chat_sessions[chat_id] = agent.start_chat()
+    while len(_chat_sessions) > MAX_CHAT_SESSIONS:
+        _chat_sessions.popitem(last=False)
+    return chat_session
+
+# Pending messages per chat, as (chat_session, user_text, bot). A chat has
+# an entry while it has messages queued or one being processed.
+_pending: dict[int, deque] = {}
+_pending_count = 0
+
+# Chats with a message ready to process. Messages of one chat share a Gemini
+# session, so a chat is queued at most once and re-queued only after its
+# current message is done; a busy chat then occupies a single worker.
+_ready_chats: asyncio.Queue = asyncio.Queue()
+_workers: list[asyncio.Task] = []
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Handler for the /start command.
@@ -48,7 +182,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Reset chat session on start
     if agent:
-        context.user_data['chat'] = agent.start_chat()
+        _chat_sessions.pop(chat_id, None)
+        get_or_create_chat(chat_id)
         
     await context.bot.send_message(
         chat_id=update.effective_chat.id,
@@ -61,6 +196,20 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode="Markdown",
     )
 
+async def flush_cache(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Handler for the /flushcache admin command.
+    """
+    chat_id = update.effective_chat.id
+    user = update.effective_user
+
+    if not user or user.id not in ADMIN_USER_IDS:
+        await context.bot.send_message(chat_id=chat_id, text="Ця команда доступна лише адміністраторам.")
+        return
+
+    clear_tool_cache()
+    await context.bot.send_message(chat_id=chat_id, text="Кеш GitHub-даних очищено.")
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Handler for text messages.
@@ -78,55 +227,139 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # Get or create chat session
-    if 'chat' not in context.user_data:
-        context.user_data['chat'] = agent.start_chat()
-    
-    chat_session = context.user_data['chat']
-    # Single "typing" notification before heavy work
-    await context.bot.send_chat_action(chat_id=chat_id, action="typing")
+    chat_session = get_or_create_chat(chat_id)
 
-    # If the message looks like a GitHub profile / link, let the user know
-    # that a potentially longer GitHub investigation is starting.
-    lowered = (user_text or "").lower()
-    if "github.com" in lowered or lowered.startswith("github.com/"):
+    # Hand the message to the worker pool; when the queues are full, shed
+    # load right away instead of piling up more concurrent Gemini/GitHub work.
+    global _pending_count
+    pending = _pending.get(chat_id)
+    if _pending_count >= BOT_QUEUE_SIZE or (pending is not None and len(pending) >= BOT_CHAT_QUEUE_SIZE):
         await context.bot.send_message(
             chat_id=chat_id,
-            text="🔎 Досліджую GitHub-профіль, це може зайняти кілька секунд...",
+            text="Зачекайте, бот зараз перевантажений. Спробуйте ще раз за хвилину.",
         )
+        return
+
+    if pending is None:
+        pending = _pending[chat_id] = deque()
+        _ready_chats.put_nowait(chat_id)
+    pending.append((chat_session, user_text, context.bot))
+    _pending_count += 1
+
+async def _worker():
+    """
+    Processes queued messages one at a time, taking the next message of
+    whichever chat is ready.
+    """
+    global _pending_count
+    while True:
+        chat_id = await _ready_chats.get()
+        pending = _pending[chat_id]
+        chat_session, user_text, bot = pending.popleft()
+        _pending_count -= 1
+        try:
+            await _process(chat_id, chat_session, user_text, bot)
+        except Exception as e:
+            logger.exception("Error processing queued message: %s", e)
+        finally:
+            # The chat's next message goes to the back of the shared queue,
+            # so other chats get their turn in between.
+            if pending:
+                _ready_chats.put_nowait(chat_id)
+            else:
+                del _pending[chat_id]
+            _ready_chats.task_done()
+
+async def start_workers(application):
+    """
+    Starts the message workers (ApplicationBuilder post_init hook).
+    """
+    for _ in range(BOT_WORKERS):
+        _workers.append(asyncio.create_task(_worker()))
+
+async def stop_workers(application):
+    """
+    Cancels the message workers (ApplicationBuilder post_shutdown hook).
+    """
+    for worker in _workers:
+        worker.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+
+async def _process(chat_id: int, chat_session, user_text: str, bot):
+    """
+    Answers one user message with a streamed Gemini reply.
+    """
+    # If the message looks like a GitHub profile / link, let the user know
+    # that a potentially longer GitHub investigation is starting. The notice
+    # doubles as the placeholder that the streamed answer replaces.
+    if _GITHUB_RE.search(user_text):
+        placeholder_text = "🔎 Досліджую GitHub-профіль, це може зайняти кілька секунд..."
+    else:
+        placeholder_text = "…"
+
+    # Telegram notifications and the Gemini call run concurrently, so the
+    # model starts working without waiting for Telegram round-trips.
+    try:
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(_notify(bot.send_chat_action(chat_id=chat_id, action="typing")))
+            placeholder_task = tg.create_task(
+                bot.send_message(chat_id=chat_id, text=placeholder_text)
+            )
+            tg.create_task(_stream_reply(bot, chat_id, chat_session, user_text, placeholder_task))
+    except* TelegramError as eg:
+        logger.error("Failed to deliver reply: %s", eg.exceptions)
+
+async def _notify(coro):
+    """
+    Awaits a best-effort Telegram notification; failures are only logged.
+    """
+    try:
+        await coro
+    except TelegramError as e:
+        logger.warning("Failed to send notification: %s", e)
 
+async def _stream_reply(bot, chat_id: int, chat_session, user_text: str, placeholder_task: asyncio.Task):
+    """
+    Streams Gemini's answer into the placeholder message once it is sent.
+    """
     try:
-        # Send message to Gemini (Gemini chat session already містить історію діалогу)
+        # Stream the answer from Gemini (Gemini chat session already містить історію діалогу)
         loop = asyncio.get_running_loop()
+        reply = ""
+        last_edit = loop.time()
 
-        response = await loop.run_in_executor(
-            None,
-            chat_session.send_message,
-            user_text
-        )
+        async for chunk in agent.stream_message(chat_session, user_text):
+            reply += chunk
+            if loop.time() - last_edit >= STREAM_EDIT_INTERVAL:
+                placeholder = await placeholder_task
+                # Partial Markdown often fails to parse, so progress is shown as plain text.
+                try:
+                    await _edit_message(bot, chat_id, placeholder.message_id, reply)
+                except TelegramError as e:
+                    logger.warning("Failed to update streamed reply: %s", e)
+                last_edit = loop.time()
+
+        if not reply.strip():
+            raise ValueError("Gemini returned an empty response")
 
-        # Try to send with Markdown; if Telegram can't parse entities,
-        # fall back to plain text so the user still gets a response.
+        # The final answer is pre-escaped to MarkdownV2, so Telegram accepts
+        # it on the first try; plain text is only a guard for surprises.
+        placeholder = await placeholder_task
         try:
-            await context.bot.send_message(
-                chat_id=chat_id,
-                text=response.text,
-                parse_mode="Markdown",
+            await _edit_message(
+                bot, chat_id, placeholder.message_id, _to_markdown_v2(reply), parse_mode="MarkdownV2"
             )
         except BadRequest as e:
-            if "Can't parse entities" in str(e):
-                logger.warning(f"Markdown parse failed, sending without formatting: {e}")
-                cleaned = _strip_markdown(response.text)
-                await context.bot.send_message(
-                    chat_id=chat_id,
-                    text=cleaned,
-                )
-            else:
-                raise
+            logger.error("MarkdownV2 reply rejected, sending without formatting: %s", e)
+            await _edit_message(bot, chat_id, placeholder.message_id, _strip_markdown(reply))
 
     except Exception as e:
-        logger.error(f"Error processing message: {e}")
-        await context.bot.send_message(
+        logger.exception("Error processing message: %s", e)
+        placeholder = await placeholder_task
+        await bot.edit_message_text(
             chat_id=chat_id,
+            message_id=placeholder.message_id,
             text="Сталася помилка під час обробки запиту. Будь ласка, спробуйте ще раз пізніше."
         )
 
@@ -136,14 +369,51 @@ if __name__ == '__main__':
         print("Error: TELEGRAM_TOKEN not found in environment variables.")
         exit(1)
 
-    application = ApplicationBuilder().token(token).build()
+    # libuv-based event loop where available (not on Windows).
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+
+    # Bot API calls (sends, edits, chat actions) share one HTTP/2 connection
+    # pool; long polling keeps its own HTTP/1.1 request object as PTB recommends.
+    request = HTTPXRequest(
+        connection_pool_size=256,
+        http_version="2",
+        read_timeout=60,
+        write_timeout=60,
+    )
+    get_updates_request = HTTPXRequest(read_timeout=60)
+    application = (
+        ApplicationBuilder()
+        .token(token)
+        .request(request)
+        .get_updates_request(get_updates_request)
+        .post_init(start_workers)
+        .post_shutdown(stop_workers)
+        .build()
+    )
     
     # Add handlers
     start_handler = CommandHandler('start', start)
+    flush_cache_handler = CommandHandler('flushcache', flush_cache)
     message_handler = MessageHandler(filters.TEXT & (~filters.COMMAND), handle_message)
     
     application.add_handler(start_handler)
+    application.add_handler(flush_cache_handler)
     application.add_handler(message_handler)
     
     print("AI Recruiter Bot is running...")
-    application.run_polling()
+    webhook_url = os.getenv("WEBHOOK_URL")
+    if webhook_url:
+        # Telegram pushes updates to us instead of being long-polled.
+        application.run_webhook(
+            listen="0.0.0.0",
+            port=int(os.getenv("PORT", "8443")),
+            url_path=os.getenv("WEBHOOK_PATH", ""),
+            webhook_url=webhook_url,
+            secret_token=os.getenv("WEBHOOK_SECRET"),
+        )
+    else:
+        application.run_polling()
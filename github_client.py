@@ -1,15 +1,587 @@
+import base64
+import contextvars
+import functools
+import heapq
+import inspect
+import io
+import itertools
+import json
 import os
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import LRUCache, TTLCache
 from github import Github
-from github.GithubException import GithubException
+from github.GithubException import GithubException, UnknownObjectException
+from urllib3.util.retry import Retry
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Upper bound on concurrent file downloads within a single inspection.
+FILE_FETCH_WORKERS = 16
+
+# Indentation of file snippets in inspect_repository_files.
+_INDENT = "    "
+
+# File extensions (without the dot) that are most useful for technical
+# assessment; inspect_repository only samples these.
+PREFERRED_EXTS = frozenset({
+    "py", "js", "ts", "tsx", "jsx",
+    "java", "go", "rs", "rb", "php",
+    "cs", "cpp", "cc", "c", "h", "hpp",
+    "scala", "kt", "swift",
+    "sh", "ps1", "bash",
+    "sql",
+    "yaml", "yml", "toml", "ini",
+    "ipynb",
+})
+
+# Dependency, build and cache directories whose files say nothing about the
+# author's code; file inspections skip everything below them.
+SKIP_DIRS = frozenset({"node_modules", ".git", "dist", "build", "vendor", "__pycache__", ".venv"})
+
+# Sustained GitHub request rate (requests per second) and burst size. The
+# default keeps us below the 5000 requests/hour quota of an authenticated token.
+GITHUB_RPS = float(os.getenv("GITHUB_RPS", 4500 / 3600))
+GITHUB_BURST = int(os.getenv("GITHUB_BURST", "50"))
+
+# Below this many remaining requests in the current window (or a tenth of
+# the window's limit, if smaller), requests are spread out over the time
+# left until the quota resets.
+LOW_RATE_LIMIT_REMAINING = 100
+
+# Upper bound on the total pacing delay within one client method call, so a
+# nearly exhausted quota slows a tool call down without stalling it for
+# minutes.
+MAX_PACING_PER_CALL = 30.0
+
+# How long a request may wait for a rate limit to reset before giving up.
+MAX_RATE_LIMIT_WAIT = 60
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+
+    Allows bursts of up to `capacity` requests and refills at `rate` tokens
+    per second; acquire() blocks until the caller's token is available.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Reserve a token even if the bucket is empty; the deficit is the wait.
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+
+
+# Shared by all clients so the budget applies to the whole process.
+_rate_limiter = TokenBucket(rate=GITHUB_RPS, capacity=GITHUB_BURST)
+
+# Upper bound on GitHub requests in flight at once across all users' tool
+# calls and file downloads; it also sizes each client's connection pool.
+GITHUB_CONCURRENCY = int(os.getenv("GITHUB_CONCURRENCY", "20"))
+_in_flight = threading.BoundedSemaphore(GITHUB_CONCURRENCY)
+
+
+class _PacingBudget:
+    """Thread-safe allowance of pacing delay, shared by one call's requests."""
+
+    def __init__(self, seconds: float):
+        self._seconds = seconds
+        self._lock = threading.Lock()
+
+    def take(self, seconds: float) -> float:
+        """Grants up to `seconds` of delay from what is left."""
+        with self._lock:
+            granted = min(seconds, self._seconds)
+            self._seconds -= granted
+            return granted
+
+
+# Pacing budget of the client method call running in the current context.
+_pacing_budget: contextvars.ContextVar[_PacingBudget | None] = contextvars.ContextVar(
+    "pacing_budget", default=None
+)
+
+
+def _map_in_context(executor, fn, items: list):
+    """
+    executor.map that runs each call in a copy of the caller's context, so
+    downloads made on pool threads draw from the caller's pacing budget.
+    """
+    contexts = [contextvars.copy_context() for _ in items]
+    return executor.map(lambda ctx, item: ctx.run(fn, item), contexts, items)
+
+
+def _rate_limit_wait(e: GithubException) -> float | None:
+    """
+    Returns how many seconds to wait before retrying a rate-limited request,
+    or None if the error is not a rate limit.
+    """
+    if e.status not in (403, 429):
+        return None
+    headers = e.headers or {}
+    if "retry-after" in headers:
+        return float(headers["retry-after"])
+    if headers.get("x-ratelimit-remaining") == "0" and "x-ratelimit-reset" in headers:
+        # The reset time has one-second resolution, so add a second of slack.
+        return max(0.0, int(headers["x-ratelimit-reset"]) - time.time() + 1)
+    return None
+
+
+# Decoded file text keyed by (repository, blob sha). Blobs are
+# content-addressed, so an entry stays valid no matter how the repository
+# changes; unchanged files are never downloaded twice.
+_BLOB_CACHE: TTLCache = TTLCache(maxsize=50_000, ttl=3600)
+_blob_cache_lock = threading.Lock()
+
+# Formatted results of the client's public methods. User summaries and
+# repository lists change more often than repository contents.
+_SUMMARY_CACHE: TTLCache = TTLCache(maxsize=1024, ttl=3600)
+_REPO_LIST_CACHE: TTLCache = TTLCache(maxsize=1024, ttl=1800)
+_REPO_CACHE: TTLCache = TTLCache(maxsize=1024, ttl=21600)
+_result_cache_lock = threading.Lock()
+
+# Results starting with these are error messages and are never cached.
+_ERROR_PREFIXES = ("Error ", "An unexpected error")
+
+
+class _PartialResult(str):
+    """A method result missing some data due to failed requests; never cached."""
+
+
+def _ttl_cached(cache: TTLCache):
+    """
+    Caches a GitHubClient method's text result in `cache`, keyed by the
+    method name and its arguments with usernames and repositories normalized.
+
+    The wrapped method takes an extra refresh=True argument to bypass the
+    cache. Results served from the cache start with a "(cached at ...)" line.
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, refresh: bool = False, **kwargs):
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            del arguments["self"]
+            if "username" in arguments:
+                arguments["username"] = self._normalize_username(arguments["username"]).lower()
+            if "repo" in arguments:
+                arguments["repo"] = self._normalize_repo_identifier(arguments["repo"]).lower()
+            key = (method.__name__, *sorted(arguments.items()))
+
+            if not refresh:
+                with _result_cache_lock:
+                    cached = cache.get(key)
+                if cached is not None:
+                    result, fetched_at = cached
+                    stamp = time.strftime("%Y-%m-%d %H:%M:%S UTC", time.gmtime(fetched_at))
+                    return f"(cached at {stamp})\n{result}"
+
+            token = _pacing_budget.set(_PacingBudget(MAX_PACING_PER_CALL))
+            try:
+                result = method(self, *args, **kwargs)
+            finally:
+                _pacing_budget.reset(token)
+            if isinstance(result, _PartialResult):
+                return str(result)
+            if not result.startswith(_ERROR_PREFIXES):
+                with _result_cache_lock:
+                    cache[key] = (result, time.time())
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def clear_caches() -> None:
+    """Drops all cached method results, so the next calls refetch from GitHub."""
+    with _result_cache_lock:
+        for cache in (_SUMMARY_CACHE, _REPO_LIST_CACHE, _REPO_CACHE):
+            cache.clear()
+
+
+# Last response per GET URL and query, as (etag, headers, body), bounded by
+# total body size. Revalidating with If-None-Match returns 304 without a
+# body, and 304s do not count against an authenticated rate limit.
+_ETAG_CACHE: LRUCache = LRUCache(maxsize=64 * 1024 * 1024, getsizeof=lambda entry: len(entry[2]))
+_etag_cache_lock = threading.Lock()
+
+
+def _conditional_request(send, verb, url, parameters=None, headers=None, *args, **kwargs):
+    """
+    Wraps Requester.requestJson with an ETag cache: GET requests carry the
+    cached ETag, and a 304 answer is replaced by the cached response.
+    """
+    if verb != "GET" or (headers and "If-None-Match" in headers):
+        return send(verb, url, parameters, headers, *args, **kwargs)
+
+    key = (url, json.dumps(parameters, sort_keys=True, default=str))
+    with _etag_cache_lock:
+        cached = _ETAG_CACHE.get(key)
+    if cached is not None:
+        headers = {**(headers or {}), "If-None-Match": cached[0]}
+
+    status, response_headers, body = send(verb, url, parameters, headers, *args, **kwargs)
+    if status == 304 and cached is not None:
+        return 200, cached[1], cached[2]
+
+    etag = response_headers.get("etag")
+    if status == 200 and etag:
+        with _etag_cache_lock:
+            try:
+                _ETAG_CACHE[key] = (etag, response_headers, body)
+            except ValueError:
+                # A single response larger than the whole cache.
+                pass
+    return status, response_headers, body
+
+
+# Appended to tool output when GitHub cut a recursive tree listing short.
+_TREE_INCOMPLETE_NOTE = "\n(GitHub truncated the file listing of this very large repository; some paths are missing.)\n"
+
+
+def _list_tree(gh_repo) -> tuple[list, bool]:
+    """
+    Lists every entry of the default branch with a single recursive
+    Git Trees API call, shallow paths first (like a breadth-first walk).
+
+    Also returns whether GitHub truncated the listing, which happens for
+    very large repositories.
+    """
+    try:
+        tree = gh_repo.get_git_tree(gh_repo.default_branch, recursive=True)
+    except GithubException as e:
+        # Empty repositories have no tree (409 Conflict); anything else is a
+        # real failure for the caller to report.
+        if e.status == 409:
+            return [], False
+        raise
+    return sorted(tree.tree, key=lambda entry: entry.path.count("/")), tree.truncated
+
+
+def _in_skipped_dir(path: str) -> bool:
+    """Tells whether a tree path lies below one of SKIP_DIRS."""
+    return not SKIP_DIRS.isdisjoint(path.split("/")[:-1])
+
+
+def _read_blob(gh_repo, entry, max_chars: int) -> str | None:
+    """
+    Returns up to max_chars characters of a file's text, or None on failure.
+    """
+    key = (gh_repo.full_name, entry.sha)
+    with _blob_cache_lock:
+        cached = _BLOB_CACHE.get(key)
+    if cached is not None:
+        text, complete = cached
+        if complete or len(text) >= max_chars:
+            return text[:max_chars]
+
+    try:
+        blob = gh_repo.get_git_blob(entry.sha)
+        text = base64.b64decode(blob.content).decode("utf-8", errors="ignore")
+    except Exception:
+        return None
+
+    with _blob_cache_lock:
+        _BLOB_CACHE[key] = (text[:max_chars], len(text) <= max_chars)
+    return text[:max_chars]
+
+
+# Number of repositories in a user summary, and how many of the most starred
+# ones get a README snippet.
+SUMMARY_MAX_REPOS = 200
+SUMMARY_TOP_REPOS = 10
+
+# README file names tried, in order, by the GraphQL summary query. Unlike
+# the REST readme endpoint, GraphQL can only look up exact paths.
+README_NAMES = (
+    "README.md", "readme.md", "Readme.md", "README.markdown",
+    "README.rst", "README.txt", "README",
+)
+
+# Profile, one page of repositories and the READMEs of the most starred ones
+# in a single GraphQL request; the REST API needs a request per README.
+# repositoryOwner resolves organizations as well as users, like REST get_user.
+_USER_SUMMARY_QUERY = """
+query($login: String!, $after: String, $more: Boolean = false) {
+  repositoryOwner(login: $login) {
+    login
+    url
+    ... on User {
+      name
+      bio
+      location
+      followers { totalCount }
+    }
+    ... on Organization {
+      name
+      bio: description
+      location
+    }
+    top: repositories(
+      first: %(top)d, privacy: PUBLIC, ownerAffiliations: OWNER,
+      orderBy: {field: STARGAZERS, direction: DESC}
+    ) @skip(if: $more) {
+      nodes {
+        ...repo
+        %(readmes)s
+      }
+    }
+    repositories(
+      first: 100, after: $after, privacy: PUBLIC, ownerAffiliations: OWNER,
+      orderBy: {field: NAME, direction: ASC}
+    ) {
+      totalCount
+      pageInfo { hasNextPage endCursor }
+      nodes { ...repo }
+    }
+  }
+}
+
+fragment repo on Repository {
+  nameWithOwner
+  stargazerCount
+  primaryLanguage { name }
+  description
+  url
+}
+""" % {
+    "top": SUMMARY_TOP_REPOS,
+    "readmes": "\n        ".join(
+        f'readme{i}: object(expression: "HEAD:{name}") {{ ... on Blob {{ text }} }}'
+        for i, name in enumerate(README_NAMES)
+    ),
+}
+
+
+def _readme_from_graphql(node: dict) -> str | None:
+    """Returns the text of the first README_NAMES file present in a node."""
+    for i in range(len(README_NAMES)):
+        blob = node.get(f"readme{i}")
+        if blob and blob.get("text") is not None:
+            return blob["text"]
+    return None
+
+
+def _repo_from_graphql(node: dict) -> dict:
+    """Maps a GraphQL repository node onto the REST field names."""
+    return {
+        "full_name": node["nameWithOwner"],
+        "stargazers_count": node["stargazerCount"],
+        "language": (node["primaryLanguage"] or {}).get("name"),
+        "description": node["description"],
+        "html_url": node["url"],
+    }
+
+
+# Stands in for a README that exists or may exist but failed to download.
+_README_UNAVAILABLE = object()
+
+
+def _read_readme(repo):
+    """
+    Returns the text of a repository's README, None if it has none, or
+    _README_UNAVAILABLE if the download failed.
+    """
+    try:
+        readme = repo.get_readme()
+    except UnknownObjectException:
+        return None
+    except Exception as e:
+        logger.warning("Failed to download README of %s: %s", repo.full_name, e)
+        return _README_UNAVAILABLE
+    return readme.decoded_content.decode("utf-8", errors="ignore")
+
+
+def _format_user_summary(
+    profile: dict,
+    repos: list[dict],
+    top_repos: list[dict],
+    readmes: dict[str, str | None],
+    include_full_list: bool = False,
+) -> str:
+    """
+    Renders a user summary from REST API profile and repository dicts.
+    readmes maps a repository's full name to its README text (None if
+    missing, _README_UNAVAILABLE if it failed to download).
+    With include_full_list, repositories outside the top ones are listed too.
+    """
+    buf = io.StringIO()
+    w = buf.write
+    w(
+        f"User: {profile['login']} ({profile['name']})\n"
+        f"Bio: {profile['bio']}\n"
+        f"Location: {profile['location']}\n"
+        f"Public Repos: {profile['public_repos']}\n"
+        f"Followers: {profile['followers']}\n"
+        f"Profile URL: {profile['html_url']}\n"
+        "\n"
+        "Repository overview:\n"
+    )
+
+    if not repos:
+        w("No public repositories found.\n")
+        return buf.getvalue()
+
+    # Aggregate languages and basic stats
+    language_counts = Counter(repo["language"] or "Unknown" for repo in repos)
+    total_stars = sum(repo["stargazers_count"] or 0 for repo in repos)
+
+    w(f"- Repositories analyzed (sample): {len(repos)}\n")
+    w(f"- Total stars across analyzed repos: {total_stars}\n")
+
+    # Simple language distribution
+    w("- Languages (by repo count):\n")
+    for lang, count in language_counts.most_common():
+        w(f"  • {lang}: {count} repos\n")
+
+    # Top repositories by stars
+    w(f"\nTop repositories by stars (up to {SUMMARY_TOP_REPOS}):\n")
+    for repo in top_repos:
+        description = repo["description"] or "No description provided."
+        w(
+            f"- {repo['full_name']} (Stars: {repo['stargazers_count']}, Language: {repo['language']})\n"
+            f"  Description: {description}\n"
+            f"  URL: {repo['html_url']}\n"
+        )
+
+        readme = readmes.get(repo["full_name"])
+        if readme is None:
+            w("  README: Not found\n")
+        elif readme is _README_UNAVAILABLE:
+            w("  README: Could not be downloaded\n")
+        else:
+            # Truncate readme to avoid hitting token limits too fast
+            w(f"  README snippet: {readme[:500]}...\n")
+
+    # The rest of the sample is opt-in; it is most of the output for users
+    # with many repositories.
+    top_names = {repo["full_name"] for repo in top_repos}
+    other_repos = [repo for repo in repos if repo["full_name"] not in top_names]
+    if not other_repos:
+        return buf.getvalue()
+    if not include_full_list:
+        w(f"\n{len(other_repos)} other analyzed repositories are not listed here.\n")
+        return buf.getvalue()
+
+    # List the other analyzed repositories so the agent can see the broader
+    # portfolio, including those without descriptions.
+    w("\nOther analyzed repositories:\n")
+    for repo in other_repos:
+        description = repo["description"] or "No description provided."
+        w(
+            f"- {repo['full_name']} | Stars: {repo['stargazers_count']} | "
+            f"Language: {repo['language']} | Description: {description}\n"
+        )
+
+    return buf.getvalue()
+
+
+# Query string and/or fragment at the end of a repository URL.
+_FRAG_RE = re.compile(r"[#?].*$", re.DOTALL)
+
+
 class GitHubClient:
-    def __init__(self, token=None):
-        self.client = Github(token) if token else Github()
+    def __init__(self, token=None, pool_size: int = GITHUB_CONCURRENCY):
+        # A single client is shared by concurrent tool calls and file
+        # downloads, so keep a pooled connection for every request in flight.
+        # Rate limits are handled in _request rather than by PyGithub's
+        # default retry, which can sleep until the hourly quota resets.
+        # urllib3 would otherwise also retry 429 responses and sleep for
+        # their full Retry-After, bypassing MAX_RATE_LIMIT_WAIT.
+        retry = Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=(500, 502, 503, 504),
+            respect_retry_after_header=False,
+        )
+        # GitHub's GraphQL API is only available to authenticated clients.
+        self.has_token = bool(token)
+        # Listings come in pages of 100 (the API maximum) instead of 30.
+        if token:
+            self.client = Github(token, per_page=100, pool_size=pool_size, retry=retry)
+        else:
+            self.client = Github(per_page=100, pool_size=pool_size, retry=retry)
+
+        # Every PyGithub call, including pagination and lazy attribute
+        # loading, goes through requestJsonAndCheck.
+        requester = self.client.requester
+        send = requester.requestJsonAndCheck
+        requester.requestJsonAndCheck = functools.partial(self._request, send)
+        # requestJsonAndCheck sends through requestJson, which revalidates
+        # repeated GETs against the ETag cache.
+        requester.requestJson = functools.partial(_conditional_request, requester.requestJson)
+
+    def _request(self, send, *args, **kwargs):
+        """
+        Sends a GitHub API request through the process-wide rate limiter,
+        retrying once after a short rate-limit reset.
 
-    def _normalize_username(self, username: str) -> str:
+        At most GITHUB_CONCURRENCY requests are in flight at a time; waits
+        for the rate limiter happen outside that limit.
+        """
+        _rate_limiter.acquire()
+        self._pace_low_quota()
+        try:
+            with _in_flight:
+                return send(*args, **kwargs)
+        except GithubException as e:
+            wait = _rate_limit_wait(e)
+            if wait is None or wait > MAX_RATE_LIMIT_WAIT:
+                raise
+            logger.warning("GitHub rate limit hit, retrying in %.0fs", wait)
+            time.sleep(wait)
+            _rate_limiter.acquire()
+            with _in_flight:
+                return send(*args, **kwargs)
+
+    def _pace_low_quota(self) -> None:
+        """
+        Slows down when the quota reported by the last response is nearly
+        used up, so the remaining requests last until it resets instead of
+        running into 403s.
+
+        The threshold scales with the reported limit, so the 60/hour
+        unauthenticated quota is only paced for its last few requests, and
+        the total delay per method call is capped by its pacing budget.
+        """
+        requester = self.client.requester
+        remaining, limit = requester.rate_limiting
+        if remaining < 0 or remaining >= min(LOW_RATE_LIMIT_REMAINING, limit // 10):
+            return
+        until_reset = requester.rate_limiting_resettime - time.time()
+        if until_reset <= 0:
+            return
+        delay = min(MAX_RATE_LIMIT_WAIT, until_reset / max(remaining, 1))
+        budget = _pacing_budget.get()
+        if budget is not None:
+            delay = budget.take(delay)
+        if delay > 0:
+            time.sleep(delay)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=2048)
+    def _normalize_username(username: str) -> str:
         """
         Normalizes a GitHub username that may be provided as a full URL
         into a bare username string.
@@ -19,12 +591,14 @@ class GitHubClient:
           - 'github.com/username/' -> 'username'
         """
         username = username.strip()
-        if "github.com/" in username:
-            username = username.split("github.com/", 1)[-1]
-        username = username.split("/", 1)[0]
-        return username.strip()
-
-    def _normalize_repo_identifier(self, repo: str) -> str:
+        _, sep, rest = username.partition("github.com/")
+        if sep:
+            username = rest
+        return username.partition("/")[0].strip()
+
+    @staticmethod
+    @functools.lru_cache(maxsize=2048)
+    def _normalize_repo_identifier(repo: str) -> str:
         """
         Normalizes various GitHub repository identifiers to 'owner/name' form.
 
@@ -34,110 +608,116 @@ class GitHubClient:
         As well as plain 'owner/name' strings.
         """
         repo = repo.strip()
-        if "github.com/" in repo:
-            repo = repo.split("github.com/", 1)[-1]
+        _, sep, rest = repo.partition("github.com/")
+        if sep:
+            repo = rest
         # Strip any trailing slashes or fragments
-        repo = repo.split("#", 1)[0].split("?", 1)[0].strip("/")
-        return repo
+        return _FRAG_RE.sub("", repo).strip("/")
 
-    def get_user_summary(self, username: str) -> str:
+    @_ttl_cached(_SUMMARY_CACHE)
+    def get_user_summary(self, username: str, include_full_list: bool = False) -> str:
         """
         Fetches a summary of a GitHub user, including bio, stats, and a
         broader overview of their repositories.
+
+        Uses a single GraphQL query when authenticated and falls back to the
+        REST API otherwise. Repositories beyond the most starred ones are
+        only listed with include_full_list.
         """
         try:
-            user = self.client.get_user(self._normalize_username(username))
-            
-            summary = [
-                f"User: {user.login} ({user.name})",
-                f"Bio: {user.bio}",
-                f"Location: {user.location}",
-                f"Public Repos: {user.public_repos}",
-                f"Followers: {user.followers}",
-                f"Profile URL: {user.html_url}",
-                "",
-                "Repository overview:",
-            ]
-
-            # Collect a broad sample of repositories to get a "full picture"
-            # while staying within reasonable API and token limits.
-            # For most users, this effectively means "all" repos.
-            max_repos = 200
-            repos = []
-            for repo in user.get_repos():
-                repos.append(repo)
-                if len(repos) >= max_repos:
-                    break
-
-            repo_count = len(repos)
-            logger.info(f"GitHubClient.get_user_summary: analyzed {repo_count} repos for user {user.login}")
-
-            if not repos:
-                summary.append("No public repositories found.")
-                return "\n".join(summary)
-
-            # Aggregate languages and basic stats
-            language_counts: dict[str, int] = {}
-            total_stars = 0
-            for repo in repos:
-                total_stars += repo.stargazers_count or 0
-                lang = repo.language or "Unknown"
-                language_counts[lang] = language_counts.get(lang, 0) + 1
-
-            summary.append(f"- Repositories analyzed (sample): {repo_count}")
-            summary.append(f"- Total stars across analyzed repos: {total_stars}")
-
-            # Simple language distribution
-            summary.append("- Languages (by repo count):")
-            for lang, count in sorted(language_counts.items(), key=lambda x: x[1], reverse=True):
-                summary.append(f"  • {lang}: {count} repos")
-
-            # Top repositories by stars
-            summary.append("\nTop repositories by stars (up to 10):")
-            top_star_repos = sorted(
-                repos,
-                key=lambda r: r.stargazers_count,
-                reverse=True
-            )[:10]
-
-            for repo in top_star_repos:
-                description = repo.description or "No description provided."
-                repo_info = [
-                    f"- {repo.full_name} (Stars: {repo.stargazers_count}, Language: {repo.language})",
-                    f"  Description: {description}",
-                    f"  URL: {repo.html_url}",
-                ]
-
-                # Try to get README for additional context
-                try:
-                    readme = repo.get_readme()
-                    content = readme.decoded_content.decode("utf-8", errors="ignore")
-                    # Truncate readme to avoid hitting token limits too fast
-                    repo_info.append(f"  README snippet: {content[:500]}...")
-                except GithubException:
-                    repo_info.append("  README: Not found")
-
-                summary.extend(repo_info)
-
-            # List all analyzed repositories so the agent can see the broader portfolio,
-            # including those without descriptions.
-            summary.append("\nAll analyzed repositories:")
-            for repo in repos:
-                description = repo.description or "No description provided."
-                summary.append(
-                    f"- {repo.full_name} | Stars: {repo.stargazers_count} | "
-                    f"Language: {repo.language} | Description: {description}"
-                )
-
-            return "\n".join(summary)
+            login = self._normalize_username(username)
+            if self.has_token:
+                profile, repos, top_repos, readmes = self._fetch_user_summary_graphql(login)
+            else:
+                profile, repos, top_repos, readmes = self._fetch_user_summary_rest(login)
+
+            logger.info("GitHubClient.get_user_summary: analyzed %s repos for user %s", len(repos), profile["login"])
+            summary = _format_user_summary(profile, repos, top_repos, readmes, include_full_list)
+            if any(readme is _README_UNAVAILABLE for readme in readmes.values()):
+                return _PartialResult(summary)
+            return summary
 
         except GithubException as e:
-            logger.error(f"GitHub Error: {e}")
+            logger.error("GitHub Error: %s", e)
             return f"Error fetching data for user {username}: {e.data.get('message', str(e))}"
         except Exception as e:
-            logger.error(f"Unexpected Error: {e}")
+            logger.error("Unexpected Error: %s", e)
             return f"An unexpected error occurred: {str(e)}"
 
+    def _fetch_user_summary_graphql(self, login: str):
+        """
+        Collects the data for get_user_summary with one GraphQL request
+        (two for users with more than 100 repositories).
+        """
+        _, data = self.client.requester.graphql_query(_USER_SUMMARY_QUERY, {"login": login})
+        owner = data["data"]["repositoryOwner"]
+        if owner is None:
+            raise GithubException(404, {"message": "Not Found"}, None)
+
+        profile = {
+            "login": owner["login"],
+            "name": owner["name"],
+            "bio": owner["bio"],
+            "location": owner["location"],
+            "public_repos": owner["repositories"]["totalCount"],
+            # Organizations have no followers in GraphQL.
+            "followers": (owner.get("followers") or {}).get("totalCount", 0),
+            "html_url": owner["url"],
+        }
+
+        page = owner["repositories"]
+        repos = [_repo_from_graphql(node) for node in page["nodes"]]
+        while page["pageInfo"]["hasNextPage"] and len(repos) < SUMMARY_MAX_REPOS:
+            variables = {"login": login, "after": page["pageInfo"]["endCursor"], "more": True}
+            _, data = self.client.requester.graphql_query(_USER_SUMMARY_QUERY, variables)
+            page = data["data"]["repositoryOwner"]["repositories"]
+            repos.extend(_repo_from_graphql(node) for node in page["nodes"])
+
+        top_nodes = owner["top"]["nodes"]
+        top_repos = [_repo_from_graphql(node) for node in top_nodes]
+        readmes = {
+            node["nameWithOwner"]: _readme_from_graphql(node)
+            for node in top_nodes
+        }
+        return profile, repos[:SUMMARY_MAX_REPOS], top_repos, readmes
+
+    def _fetch_user_summary_rest(self, login: str):
+        """
+        Collects the data for get_user_summary through the REST API, with one
+        request per README.
+
+        Fields are read from the objects' response JSON (_rawData) rather than
+        through PyGithub attributes. The public raw_data property would first
+        complete each listed repository with a request of its own.
+        """
+        user = self.client.get_user(login)
+        profile = user._rawData
+
+        # Collect a broad sample of repositories to get a "full picture"
+        # while staying within reasonable API and token limits.
+        # For most users, this effectively means "all" repos.
+        gh_repos = list(itertools.islice(user.get_repos(), SUMMARY_MAX_REPOS))
+
+        # The listing is needed anyway for the language and star totals, so
+        # rank it locally instead of spending a Search API request.
+        top_gh_repos = heapq.nlargest(
+            SUMMARY_TOP_REPOS,
+            gh_repos,
+            key=lambda r: r._rawData["stargazers_count"] or 0,
+        )
+
+        # README downloads are independent round trips, so overlap them.
+        with ThreadPoolExecutor(max_workers=SUMMARY_TOP_REPOS) as executor:
+            readmes = dict(zip(
+                (repo._rawData["full_name"] for repo in top_gh_repos),
+                _map_in_context(executor, _read_readme, top_gh_repos),
+            ))
+
+        repos = [repo._rawData for repo in gh_repos]
+        top_repos = [repo._rawData for repo in top_gh_repos]
+        return profile, repos, top_repos, readmes
+
+    @_ttl_cached(_REPO_LIST_CACHE)
     def list_user_repositories(self, username: str, max_repos: int = 300) -> str:
         """
         Returns a list of repositories for the given user, including basic
@@ -149,43 +729,49 @@ class GitHubClient:
         try:
             user = self.client.get_user(self._normalize_username(username))
 
-            lines: list[str] = [
-                f"Repositories for user: {user.login} ({user.name})",
-                f"Total public repos reported by GitHub: {user.public_repos}",
-                "",
-                f"Listing up to {max_repos} repositories:",
-            ]
+            buf = io.StringIO()
+            w = buf.write
+            w(
+                f"Repositories for user: {user.login} ({user.name})\n"
+                f"Total public repos reported by GitHub: {user.public_repos}\n"
+                "\n"
+                f"Listing up to {max_repos} repositories:\n"
+            )
 
             count = 0
-            for repo in user.get_repos():
-                lines.append(
-                    f"- {repo.full_name} | Stars: {repo.stargazers_count} | "
-                    f"Language: {repo.language} | URL: {repo.html_url}"
+            # Tool calls may pass numbers as floats; islice needs an int.
+            for repo in itertools.islice(user.get_repos(), int(max_repos)):
+                # Read the listing's JSON directly, as in _fetch_user_summary_rest.
+                data = repo._rawData
+                w(
+                    f"- {data['full_name']} | Stars: {data['stargazers_count']} | "
+                    f"Language: {data['language']} | URL: {data['html_url']}\n"
                 )
-                if repo.description:
-                    lines.append(f"  Description: {repo.description}")
+                if data["description"]:
+                    w(f"  Description: {data['description']}\n")
 
                 count += 1
-                if count >= max_repos:
-                    break
 
             if count == 0:
-                lines.append("No public repositories found.")
+                w("No public repositories found.\n")
 
             logger.info(
-                f"GitHubClient.list_user_repositories: listed {count} repos "
-                f"for user {user.login} (max_repos={max_repos})"
+                "GitHubClient.list_user_repositories: listed %s repos for user %s (max_repos=%s)",
+                count,
+                user.login,
+                max_repos,
             )
 
-            return "\n".join(lines)
+            return buf.getvalue()
 
         except GithubException as e:
-            logger.error(f"GitHub Error while listing repos: {e}")
+            logger.error("GitHub Error while listing repos: %s", e)
             return f"Error listing repositories for user {username}: {e.data.get('message', str(e))}"
         except Exception as e:
-            logger.error(f"Unexpected Error while listing repos: {e}")
+            logger.error("Unexpected Error while listing repos: %s", e)
             return f"An unexpected error occurred while listing repositories: {str(e)}"
 
+    @_ttl_cached(_REPO_CACHE)
     def inspect_repository(
         self,
         repo: str,
@@ -204,90 +790,84 @@ class GitHubClient:
             repo_id = self._normalize_repo_identifier(repo)
             gh_repo = self.client.get_repo(repo_id)
 
-            summary: list[str] = [
-                f"Repository: {gh_repo.full_name}",
-                f"Description: {gh_repo.description}",
-                f"Stars: {gh_repo.stargazers_count}",
-                f"Forks: {gh_repo.forks_count}",
-                f"Language: {gh_repo.language}",
-                f"URL: {gh_repo.html_url}",
-                "",
-                "Code inspection (limited sample):",
-            ]
-
-            # Breadth-first traversal of the repo tree, collecting a limited
-            # number of reasonably-sized text files.
-            to_visit = [""]
-            files_added = 0
+            buf = io.StringIO()
+            w = buf.write
+            w(
+                f"Repository: {gh_repo.full_name}\n"
+                f"Description: {gh_repo.description}\n"
+                f"Stars: {gh_repo.stargazers_count}\n"
+                f"Forks: {gh_repo.forks_count}\n"
+                f"Language: {gh_repo.language}\n"
+                f"URL: {gh_repo.html_url}\n"
+                "\n"
+                "Code inspection (limited sample):\n"
+            )
 
-            # Extensions that are most useful for technical assessment.
-            preferred_exts = {
-                ".py", ".js", ".ts", ".tsx", ".jsx",
-                ".java", ".go", ".rs", ".rb", ".php",
-                ".cs", ".cpp", ".cc", ".c", ".h", ".hpp",
-                ".scala", ".kt", ".swift",
-                ".sh", ".ps1", ".bash",
-                ".sql",
-                ".yaml", ".yml", ".toml", ".ini",
-                ".ipynb",
-            }
-
-            while to_visit and files_added < max_files:
-                path = to_visit.pop(0)
-                try:
-                    contents = gh_repo.get_contents(path or "")
-                except GithubException:
-                    continue
+            # Select a limited number of reasonably-sized source files from
+            # the full tree, shallow paths first, then download only those.
+            selected = []
+            tree, tree_incomplete = _list_tree(gh_repo)
+            for entry in tree:
+                if len(selected) >= max_files:
+                    break
 
-                if not isinstance(contents, list):
-                    contents = [contents]
+                if entry.type != "blob":
+                    continue
 
-                for item in contents:
-                    if files_added >= max_files:
-                        break
+                # Prefer source files; skip obvious assets/binaries
+                _, dot, ext = entry.path.rpartition(".")
+                if not dot or ext.lower() not in PREFERRED_EXTS:
+                    continue
 
-                    if item.type == "dir":
-                        to_visit.append(item.path)
-                        continue
+                if _in_skipped_dir(entry.path):
+                    continue
 
-                    # Optional simple path filter (e.g. 'src', 'backend', 'api')
-                    if path_filter and path_filter.lower() not in item.path.lower():
-                        continue
+                # Optional simple path filter (e.g. 'src', 'backend', 'api')
+                if path_filter and path_filter.lower() not in entry.path.lower():
+                    continue
 
-                    # Skip very large files to avoid huge responses
-                    if item.size and item.size > max_file_chars * 4:
-                        continue
+                # Skip very large files to avoid huge responses
+                if entry.size and entry.size > max_file_chars * 4:
+                    continue
 
-                    # Prefer source files; skip obvious assets/binaries
-                    ext = os.path.splitext(item.path)[1].lower()
-                    if preferred_exts and ext not in preferred_exts:
-                        continue
+                selected.append(entry)
 
-                    try:
-                        raw = item.decoded_content.decode("utf-8", errors="ignore")
-                    except Exception:
+            files_added = 0
+            failed = 0
+            with ThreadPoolExecutor(max_workers=FILE_FETCH_WORKERS) as executor:
+                snippets = _map_in_context(executor, lambda entry: _read_blob(gh_repo, entry, max_file_chars), selected)
+                for entry, snippet in zip(selected, snippets):
+                    if snippet is None:
+                        failed += 1
                         continue
 
-                    snippet = raw[:max_file_chars]
-                    summary.append("")
-                    summary.append(f"File: {item.path} (approx. {item.size} bytes)")
-                    summary.append("Code snippet:")
-                    summary.append(snippet)
+                    w(f"\nFile: {entry.path} (approx. {entry.size} bytes)\nCode snippet:\n")
+                    w(snippet)
+                    w("\n")
 
                     files_added += 1
 
+            if failed:
+                w(f"\n({failed} selected files could not be downloaded.)\n")
+
+            if tree_incomplete:
+                w(_TREE_INCOMPLETE_NOTE)
+
             if files_added == 0:
-                summary.append("\nNo suitable code files were found with the current limits.")
+                w("\nNo suitable code files were found with the current limits.\n")
 
-            return "\n".join(summary)
+            if failed:
+                return _PartialResult(buf.getvalue())
+            return buf.getvalue()
 
         except GithubException as e:
-            logger.error(f"GitHub Error during repo inspection: {e}")
+            logger.error("GitHub Error during repo inspection: %s", e)
             return f"Error inspecting repository {repo}: {e.data.get('message', str(e))}"
         except Exception as e:
-            logger.error(f"Unexpected Error during repo inspection: {e}")
+            logger.error("Unexpected Error during repo inspection: %s", e)
             return f"An unexpected error occurred while inspecting {repo}: {str(e)}"
 
+    @_ttl_cached(_REPO_CACHE)
     def get_repository_tree(
         self,
         repo: str,
@@ -296,82 +876,77 @@ class GitHubClient:
         """
         Returns a textual folder/file tree for the given repository.
 
-        The tree is depth-first and limited to max_entries entries to avoid
-        overly large responses.
+        The tree is limited to max_entries entries to avoid overly large
+        responses; shallow entries are kept first, so the top level is
+        always complete.
         """
         try:
             repo_id = self._normalize_repo_identifier(repo)
             gh_repo = self.client.get_repo(repo_id)
 
-            lines: list[str] = [
-                f"Repository: {gh_repo.full_name}",
-                f"URL: {gh_repo.html_url}",
-                "",
-                f"Folder structure (up to {max_entries} entries):",
-            ]
+            buf = io.StringIO()
+            w = buf.write
+            w(
+                f"Repository: {gh_repo.full_name}\n"
+                f"URL: {gh_repo.html_url}\n"
+                "\n"
+                f"Folder structure (up to {max_entries} entries):\n"
+            )
 
-            stack: list[tuple[str, int]] = [("", 0)]
+            # _list_tree is shallowest-first, so the cut never drops a
+            # directory while keeping its contents. Sorting the survivors by
+            # path components then lists every directory right before its
+            # contents, so the depth of each path is its indentation.
+            tree, tree_incomplete = _list_tree(gh_repo)
+            # Tool calls may pass numbers as floats; slicing needs an int.
+            shown = sorted(tree[:int(max_entries)], key=lambda entry: entry.path.split("/"))
             entries = 0
 
-            while stack and entries < max_entries:
-                path, depth = stack.pop()
-                try:
-                    contents = gh_repo.get_contents(path or "")
-                except GithubException:
-                    continue
-
-                if not isinstance(contents, list):
-                    contents = [contents]
-
-                # Sort to keep directories grouped
-                contents.sort(key=lambda c: (c.type != "dir", c.path))
+            for entry in shown:
+                name = os.path.basename(entry.path)
+                indent = "  " * entry.path.count("/")
 
-                for item in contents:
-                    if entries >= max_entries:
-                        break
+                if entry.type == "tree":
+                    w(f"{indent}[D] {name}/\n")
+                else:
+                    w(f"{indent}[F] {name}\n")
 
-                    name = os.path.basename(item.path)
-                    indent = "  " * depth
+                entries += 1
 
-                    if item.type == "dir":
-                        lines.append(f"{indent}[D] {name}/")
-                        # Push directory contents for later
-                        stack.append((item.path, depth + 1))
-                    else:
-                        lines.append(f"{indent}[F] {name}")
+            if len(tree) > max_entries:
+                w(f"\n(Tree truncated at {max_entries} entries to keep the response manageable.)\n")
 
-                    entries += 1
-
-            if entries >= max_entries:
-                lines.append(
-                    f"\n(Tree truncated at {max_entries} entries to keep the response manageable.)"
-                )
+            if tree_incomplete:
+                w(_TREE_INCOMPLETE_NOTE)
 
             if entries == 0:
-                lines.append("No files or folders found in repository.")
+                w("No files or folders found in repository.\n")
 
-            return "\n".join(lines)
+            return buf.getvalue()
 
         except GithubException as e:
-            logger.error(f"GitHub Error while reading tree: {e}")
+            logger.error("GitHub Error while reading tree: %s", e)
             return f"Error getting folder structure for {repo}: {e.data.get('message', str(e))}"
         except Exception as e:
-            logger.error(f"Unexpected Error while reading tree: {e}")
+            logger.error("Unexpected Error while reading tree: %s", e)
             return f"An unexpected error occurred while getting folder structure: {str(e)}"
 
+    @_ttl_cached(_REPO_CACHE)
     def inspect_repository_files(
         self,
         repo: str,
         max_files: int = 200,
         max_chars_per_file: int = 300,
         path_filter: str | None = None,
+        max_total_chars: int = 100_000,
     ) -> str:
         """
         Returns snippets of code for each file in the repository.
 
         Each file contributes up to max_chars_per_file characters. Very large
         or binary files may be skipped. The total number of files is limited
-        by max_files.
+        by max_files, and files stop being added once their snippets could
+        exceed max_total_chars characters in total.
         """
         try:
             # Be defensive: tools may pass these as strings/floats.
@@ -387,65 +962,82 @@ class GitHubClient:
             repo_id = self._normalize_repo_identifier(repo)
             gh_repo = self.client.get_repo(repo_id)
 
-            lines: list[str] = [
-                f"Repository: {gh_repo.full_name}",
-                f"URL: {gh_repo.html_url}",
-                "",
-                f"File snippets (up to {max_files_int} files, {max_chars_int} characters each):",
-            ]
+            buf = io.StringIO()
+            w = buf.write
+            w(
+                f"Repository: {gh_repo.full_name}\n"
+                f"URL: {gh_repo.html_url}\n"
+                "\n"
+                f"File snippets (up to {max_files_int} files, {max_chars_int} characters each):\n"
+            )
 
-            to_visit = [""]
-            files_added = 0
+            # One recursive tree listing gives every path with its size and
+            # blob sha; only the selected files are then downloaded,
+            # concurrently and through the blob cache.
+            selected = []
+            # A snippet has at most min(size, max_chars) characters, so the
+            # budget is enforced before any file is downloaded.
+            budget = max_total_chars
+            over_budget = False
+            tree, tree_incomplete = _list_tree(gh_repo)
+            for entry in tree:
+                if len(selected) >= max_files_int:
+                    break
 
-            while to_visit and files_added < max_files_int:
-                path = to_visit.pop(0)
-                try:
-                    contents = gh_repo.get_contents(path or "")
-                except GithubException:
+                if entry.type != "blob" or _in_skipped_dir(entry.path):
                     continue
 
-                if not isinstance(contents, list):
-                    contents = [contents]
+                # Optional simple path filter (e.g. 'src', 'backend', 'api')
+                if path_filter and path_filter.lower() not in entry.path.lower():
+                    continue
 
-                for item in contents:
-                    if files_added >= max_files_int:
-                        break
+                # Skip very large files/binaries based on size hint
+                if entry.size and entry.size > max_chars_int * 20:
+                    continue
 
-                    if item.type == "dir":
-                        to_visit.append(item.path)
-                        continue
+                budget -= min(entry.size or 0, max_chars_int)
+                if budget < 0:
+                    over_budget = True
+                    break
 
-                    # Optional simple path filter (e.g. 'src', 'backend', 'api')
-                    if path_filter and path_filter.lower() not in item.path.lower():
-                        continue
+                selected.append(entry)
 
-                    # Skip very large files/binaries based on size hint
-                    if item.size and item.size > max_chars_int * 20:
+            files_added = 0
+            failed = 0
+            with ThreadPoolExecutor(max_workers=FILE_FETCH_WORKERS) as executor:
+                snippets = _map_in_context(executor, lambda entry: _read_blob(gh_repo, entry, max_chars_int), selected)
+                for entry, snippet in zip(selected, snippets):
+                    if snippet is None:
+                        failed += 1
                         continue
 
-                    try:
-                        raw = item.decoded_content.decode("utf-8", errors="ignore")
-                    except Exception:
-                        continue
+                    w(f"\nFile: {entry.path} (approx. {entry.size} bytes)\nSnippet:\n")
+                    # Indent the whole snippet with one string operation.
+                    w(_INDENT)
+                    w(snippet.rstrip("\n").replace("\n", "\n" + _INDENT))
+                    w("\n")
 
-                    snippet = raw[:max_chars_int]
+                    files_added += 1
 
-                    lines.append("")
-                    lines.append(f"File: {item.path} (approx. {item.size} bytes)")
-                    lines.append("Snippet:")
-                    indented = "\n".join(f"    {ln}" for ln in snippet.splitlines())
-                    lines.append(indented)
+            if over_budget:
+                w(f"\n(Further files omitted to keep snippets under {max_total_chars} characters in total.)\n")
 
-                    files_added += 1
+            if failed:
+                w(f"\n({failed} selected files could not be downloaded.)\n")
+
+            if tree_incomplete:
+                w(_TREE_INCOMPLETE_NOTE)
 
             if files_added == 0:
-                lines.append("\nNo suitable text files were found with the current limits.")
+                w("\nNo suitable text files were found with the current limits.\n")
 
-            return "\n".join(lines)
+            if failed:
+                return _PartialResult(buf.getvalue())
+            return buf.getvalue()
 
         except GithubException as e:
-            logger.error(f"GitHub Error while inspecting files: {e}")
+            logger.error("GitHub Error while inspecting files: %s", e)
             return f"Error inspecting files for {repo}: {e.data.get('message', str(e))}"
         except Exception as e:
-            logger.error(f"Unexpected Error while inspecting files: {e}")
+            logger.error("Unexpected Error while inspecting files: %s", e)
             return f"An unexpected error occurred while inspecting files for {repo}: {str(e)}"
@@ -0,0 +1,97 @@
+"""
+Checks for the hand-written function-calling loop in ai_agent.py.
+
+Run with pytest; skipped when google-generativeai is not installed.
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+genai = pytest.importorskip("google.generativeai")
+
+import ai_agent
+
+
+def _reply(*parts):
+    content = genai.protos.Content(role="model", parts=list(parts))
+    return SimpleNamespace(candidates=[SimpleNamespace(content=content)])
+
+
+def _text(text):
+    return _reply(genai.protos.Part(text=text))
+
+
+def _function_call(name, **args):
+    return _reply(genai.protos.Part(function_call=genai.protos.FunctionCall(name=name, args=args)))
+
+
+class FakeChat:
+    """Commits each exchange to history as soon as the reply arrives, like ChatSession."""
+
+    def __init__(self, *replies):
+        self.history = []
+        self._replies = iter(replies)
+
+    async def send_message_async(self, content, stream=False):
+        reply = next(self._replies)
+        if isinstance(reply, Exception):
+            raise reply
+        self.history += [content, reply.candidates[0].content]
+        return reply
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    monkeypatch.setattr(ai_agent, "USE_ASYNC_CHAT", True)
+    monkeypatch.setattr(ai_agent, "_build_model", lambda model_name: None)
+    return ai_agent.AIAgent()
+
+
+def test_tool_error_is_returned_to_model(agent):
+    chat = FakeChat(
+        _function_call("list_github_repositories", repo="torvalds"),
+        _text("Which user did you mean?"),
+    )
+    response = asyncio.run(agent.send_message(chat, "repos of torvalds"))
+
+    assert response.candidates[0].content.parts[0].text == "Which user did you mean?"
+    tool_result = chat.history[2].parts[0].function_response.response["result"]
+    assert tool_result.startswith("Error calling list_github_repositories:")
+
+
+def test_failed_turn_restores_history(agent):
+    chat = FakeChat(
+        _text("Hi!"),
+        _function_call("list_github_repositories", repo="torvalds"),
+        RuntimeError("connection reset"),
+    )
+    asyncio.run(agent.send_message(chat, "hello"))
+    history = list(chat.history)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(agent.send_message(chat, "repos of torvalds"))
+    assert chat.history == history
+
+
+class _BrokenStream:
+    def __init__(self, reply):
+        self.candidates = reply.candidates
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        yield self
+        raise ConnectionError("stream dropped")
+
+
+def test_interrupted_stream_restores_history(agent):
+    chat = FakeChat(_BrokenStream(_text("Partial")))
+
+    async def consume():
+        return [piece async for piece in agent.stream_message(chat, "hello")]
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(consume())
+    assert chat.history == []
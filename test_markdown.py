@@ -0,0 +1,52 @@
+"""
+Input/output checks for the Telegram MarkdownV2 conversion in bot.py.
+
+Run with `python test_markdown.py` (or pytest).
+"""
+from bot import _to_markdown_v2
+
+
+def test_code_fence():
+    text = "```python\nprint(`x`) \\ 1.5\n```"
+    assert _to_markdown_v2(text) == "```\nprint(\\`x\\`) \\\\ 1.5\n```"
+
+
+def test_inline_code():
+    assert _to_markdown_v2("run `a_b.py` now.") == "run `a_b.py` now\\."
+
+
+def test_link():
+    text = "[repo](https://github.com/a/b)"
+    assert _to_markdown_v2(text) == "[repo](https://github.com/a/b)"
+
+
+def test_link_with_parentheses():
+    text = "[x](https://en.wikipedia.org/wiki/Foo_(bar)) end"
+    assert _to_markdown_v2(text) == "[x](https://en.wikipedia.org/wiki/Foo_(bar\\)) end"
+
+
+def test_heading():
+    assert _to_markdown_v2("## Summary: *good*") == "*Summary: good*"
+
+
+def test_bullet():
+    assert _to_markdown_v2("- first\n  * nested") == "• first\n  • nested"
+
+
+def test_bold():
+    assert _to_markdown_v2("**Strong** and *bold*") == "*Strong* and *bold*"
+
+
+def test_lone_asterisk():
+    assert _to_markdown_v2("2 * 3 = 6") == "2 \\* 3 \\= 6"
+
+
+def test_backslash():
+    assert _to_markdown_v2("C:\\path") == "C:\\\\path"
+
+
+if __name__ == "__main__":
+    for name, check in list(globals().items()):
+        if name.startswith("test_"):
+            check()
+            print(f"  ✅ {name}")
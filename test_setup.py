@@ -46,6 +46,7 @@ def test_imports():
         ('google.generativeai', 'google-generativeai'),
         ('github', 'PyGithub'),
         ('dotenv', 'python-dotenv'),
+        ('cachetools', 'cachetools'),
     ]
     
     missing = []